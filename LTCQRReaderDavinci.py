@@ -1,13 +1,14 @@
 import cv2
-import pandas as pd
 import numpy as np
-from pyzbar.pyzbar import decode
 import argparse
+import csv
 import re
 import os
 import time
 from concurrent.futures import ThreadPoolExecutor
 
+_TC_RE = re.compile(r"\d{2}:\d{2}:\d{2}:\d{2}")
+
 class QRExtractor:
     """Extracts QR codes from video frames."""
     def __init__(self, video_path):
@@ -17,29 +18,145 @@ class QRExtractor:
         self.resolution = f"{int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}"
         self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
-    def extract_frames(self):
-        """Yields frames from the video."""
+    def extract_frames(self, skip_n=0):
+        """Yields frames from the video, passing over skip_n frames after each one."""
         while self.cap.isOpened():
-            ret, frame = self.cap.read()
+            if not self.cap.grab():
+                break
+            ret, frame = self.cap.retrieve()
             if not ret:
                 break
             timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000  # Timestamp in seconds
             yield frame, timestamp
+            self.skip_frames(skip_n)
         self.cap.release()
 
+    def skip_frames(self, count):
+        """Advances past the next frames without converting them to BGR, returns how many were passed."""
+        for skipped in range(count):
+            if not self.cap.grab():
+                return skipped
+        return max(count, 0)
+
+    def position(self):
+        """Returns the index of the frame the next read will return."""
+        return int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+    def seek(self, index):
+        """Makes the next read return the frame at index."""
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+def cuda_available():
+    """Returns True if OpenCV was built with CUDA and can see a device."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+class CudaFramePreprocessor:
+    """
+    Converts frames to grayscale and half resolution on the GPU in batches. Two CUDA streams
+    alternate between batches, so one batch uploads and converts while the previous one is
+    downloaded. Only the grayscale images are copied back to the host.
+    """
+    def __init__(self, batch_size=8):
+        self.batch_size = batch_size
+        self.streams = [cv2.cuda_Stream(), cv2.cuda_Stream()]
+
+    def process(self, frames):
+        """Yields (gray, small, timestamp) for each (frame, timestamp) pair, in order."""
+        pending = None
+        batch = []
+        index = 0
+        for frame, timestamp in frames:
+            batch.append((frame, timestamp))
+            if len(batch) == self.batch_size:
+                queued = self.enqueue(batch, self.streams[index % 2])
+                index += 1
+                batch = []
+                if pending is not None:
+                    yield from self.collect(*pending)
+                pending = queued
+        if batch:
+            queued = self.enqueue(batch, self.streams[index % 2])
+            if pending is not None:
+                yield from self.collect(*pending)
+            pending = queued
+        if pending is not None:
+            yield from self.collect(*pending)
+
+    def enqueue(self, batch, stream):
+        """Queues upload, conversion and download of a batch on a stream without waiting for it."""
+        jobs = []
+        for frame, timestamp in batch:
+            gpu_frame = cv2.cuda_GpuMat()
+            gpu_frame.upload(frame, stream)
+            gpu_gray = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGR2GRAY, stream=stream)
+            size = (frame.shape[1] // 2, frame.shape[0] // 2)
+            gpu_small = cv2.cuda.resize(gpu_gray, size, stream=stream)
+            # Keep the device buffers alive until the stream has finished with them
+            jobs.append((gpu_frame, gpu_gray, gpu_small, gpu_gray.download(stream), gpu_small.download(stream), timestamp))
+        return jobs, stream
+
+    def collect(self, jobs, stream):
+        stream.waitForCompletion()
+        for _, _, _, gray, small, timestamp in jobs:
+            yield gray, small, timestamp
+
 class QRProcessor:
     """Processes frames to extract QR code timecodes."""
-    def __init__(self):
+    def __init__(self, bbox_scale=1.2, max_misses=5):
         self.qr_cache = {}
         self.qr_decoder = cv2.QRCodeDetector()
+        # Region (x, y, w, h) of the full frame where the code was last found
+        self.last_bbox = None
+        self.bbox_scale = bbox_scale
+        self.max_misses = max_misses
+        self.misses = 0
 
     def extract_qr_timecode(self, frame):
         """Decodes QR code from a frame using GPU acceleration."""
-        frame_hash = self.hash_frame(frame)
+        # The detector only needs luminance, and half resolution is usually enough to find the code
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (gray.shape[1] // 2, gray.shape[0] // 2))
+        return self.extract_gray_timecode(gray, small)
+
+    def extract_gray_timecode(self, gray, small):
+        """Decodes QR code from a grayscale frame and its half-resolution copy."""
+        frame_hash = self.hash_frame(small)
 
         if frame_hash in self.qr_cache:
             return self.qr_cache[frame_hash]
 
+        qr_data = None
+        last_bbox = self.last_bbox
+        if last_bbox is not None:
+            # The code rarely moves, so first look only where it was found last time
+            x, y, w, h = last_bbox
+            qr_data, corners = self.decode_timecode(gray[y:y + h, x:x + w])
+            if qr_data:
+                corners = corners + (x, y)
+        if not qr_data:
+            # Only fall back to the full-resolution frame if the small one has no readable code
+            qr_data, corners = self.decode_timecode(small)
+            if qr_data:
+                corners = corners * 2
+            else:
+                qr_data, corners = self.decode_timecode(gray)
+
+        if qr_data:
+            self.last_bbox = self.expand_bbox(corners, gray.shape)
+            self.misses = 0
+        else:
+            self.misses += 1
+            if self.misses >= self.max_misses:
+                self.last_bbox = None
+
+        self.qr_cache[frame_hash] = qr_data
+        return qr_data
+
+    def decode_timecode(self, frame):
+        """Runs the QR detector on a frame and returns the timecode it holds and the code's corners."""
         # Use OpenCV's QR Code Detector (CPU-based, but optimized)
         retval, decoded_info, points, straight_qrcode = self.qr_decoder.detectAndDecodeMulti(frame)
 
@@ -47,37 +164,41 @@ class QRProcessor:
             qr_data = decoded_info[0].strip()
             qr_data = self.fix_qr_data(qr_data)
             if self.is_valid_timecode(qr_data):
-                self.qr_cache[frame_hash] = qr_data
-                return qr_data
-
-        self.qr_cache[frame_hash] = None
-        return None
+                return qr_data, points[0]
+        return None, None
+
+    def expand_bbox(self, corners, shape):
+        """Returns the box around the code's corners, grown by bbox_scale and clipped to the frame."""
+        (x0, y0), (x1, y1) = corners.min(axis=0), corners.max(axis=0)
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        half_w, half_h = (x1 - x0) * self.bbox_scale / 2, (y1 - y0) * self.bbox_scale / 2
+        x, y = max(int(cx - half_w), 0), max(int(cy - half_h), 0)
+        w = min(int(cx + half_w) + 1, shape[1]) - x
+        h = min(int(cy + half_h) + 1, shape[0]) - y
+        return x, y, w, h
 
     def hash_frame(self, frame):
         """Simple hash to detect duplicate frames."""
         return cv2.mean(frame)
 
     def fix_qr_data(self, qr_data):
-        if qr_data.startswith("[") and qr_data.endswith("]"):
-            qr_data = qr_data[1:-1]
-        if qr_data.startswith('"') and qr_data.endswith('"'):
-            qr_data = qr_data[1:-1]
-        return qr_data
+        # Payloads may come wrapped as ["HH:MM:SS:FF"]
+        return qr_data.strip('[]"')
 
     def is_valid_timecode(self, data):
         """Validates if the extracted data is a timecode format HH:MM:SS:FF."""
-        return bool(re.match(r"\d{2}:\d{2}:\d{2}:\d{2}", data))
+        return _TC_RE.match(data) is not None
 
 class VideoQRTimecodeProcessor:
     """Combines QR extraction & processing to generate a CSV formatted for DaVinci Resolve."""
-    def __init__(self, video_path, output_csv):
+    def __init__(self, video_path, output_csv, skip_n=0):
         self.video_path = video_path
         self.output_csv = output_csv
+        self.skip_n = skip_n  # Frames left undecoded after each decoded one
         self.qr_extractor = QRExtractor(video_path)
         self.qr_processor = QRProcessor()
     
     def process_frame(self, frame):
-        frame = cv2.resize(frame, (frame.shape[1] // 2, frame.shape[0] // 2))
         return self.qr_processor.extract_qr_timecode(frame)
 
     def process_video_threaded(self):
@@ -104,9 +225,16 @@ class VideoQRTimecodeProcessor:
             future_to_frame = {}  # Map future results to frame numbers
 
             # Submit frame processing tasks
-            for frame, timestamp in self.qr_extractor.extract_frames():
-                future = executor.submit(self.process_frame, frame)
-                future_to_frame[future] = timestamp  # Store timestamp with each future
+            frames = self.qr_extractor.extract_frames(self.skip_n)
+            if cuda_available():
+                # Grayscale conversion and downscaling run on the GPU, decoding stays on the CPU
+                for gray, small, timestamp in CudaFramePreprocessor().process(frames):
+                    future = executor.submit(self.qr_processor.extract_gray_timecode, gray, small)
+                    future_to_frame[future] = timestamp
+            else:
+                for frame, timestamp in frames:
+                    future = executor.submit(self.process_frame, frame)
+                    future_to_frame[future] = timestamp  # Store timestamp with each future
 
             # Process completed futures
             for future in future_to_frame:
@@ -138,8 +266,10 @@ class VideoQRTimecodeProcessor:
             ])
 
         # Save to CSV
-        df = pd.DataFrame(data, columns=headers)
-        df.to_csv(self.output_csv, index=False)
+        with open(self.output_csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(data)
 
         print(f"[INFO] DaVinci Resolve CSV saved to {self.output_csv}")
 
@@ -160,42 +290,78 @@ class VideoQRTimecodeProcessor:
             "Bit Depth", "Field Dominance", "Data Level", "Audio Bit Depth", "Date Modified"
         ]
 
-        data = []
-
         prev_timecode = None
         start_frame = None
+        # Shortest stretch of one timecode seen between two changes, in frames. The QR code
+        # is not expected to change sooner than that, so all but the last of those frames are
+        # skipped undecoded. Not used together with a fixed skip_n, which hides the real
+        # segment lengths.
+        shortest_segment = None
+        seen_change = False
+        # Frame to rescan from if the first frame read after a skip no longer shows the
+        # previous timecode, meaning the change may have happened inside the skipped frames
+        resume_at = None
+
+        # Write each segment to the CSV as soon as it ends
+        with open(self.output_csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+
+            for frame, timestamp in self.qr_extractor.extract_frames(self.skip_n):
+                timecode = self.qr_processor.extract_qr_timecode(frame)
+                current_frame = int(timestamp * frame_rate)
 
-        for frame, timestamp in self.qr_extractor.extract_frames():
-            timecode = self.qr_processor.extract_qr_timecode(frame)
-            current_frame = int(timestamp * frame_rate)
-
-            if timecode:
-                if prev_timecode is None:
+                if resume_at is not None:
+                    if timecode != prev_timecode:
+                        # Go back and read the skipped frames one by one, and learn the
+                        # segment length again since the code changes sooner than expected
+                        self.qr_extractor.seek(resume_at)
+                        resume_at = None
+                        shortest_segment = None
+                        seen_change = False
+                        continue
+                    resume_at = None
+
+                if not timecode:
+                    # A missed read hides where the segment really ended
+                    shortest_segment = None
+                    seen_change = False
+                elif prev_timecode is None:
                     # First clip
                     prev_timecode = timecode
                     start_frame = current_frame
                 elif timecode != prev_timecode:
                     # Save previous segment
-                    data.append([
+                    writer.writerow([
                         video_filename, video_dir, "", frame_rate, "48000", "2", "", "H.264", "AAC",
                         prev_timecode, timecode, start_frame, current_frame - 1, (current_frame - start_frame),
                         "8", "", "", "16", ""
                     ])
+                    if seen_change:
+                        segment = current_frame - start_frame
+                        shortest_segment = segment if shortest_segment is None else min(shortest_segment, segment)
+                    seen_change = True
                     # Start new segment
                     prev_timecode = timecode
                     start_frame = current_frame
-
-        # Save last segment
-        if prev_timecode:
-            data.append([
-                video_filename, video_dir, "", frame_rate, "48000", "2", "", "H.264", "AAC",
-                prev_timecode, prev_timecode, start_frame, self.qr_extractor.total_frames - 1, (self.qr_extractor.total_frames - start_frame),
-                "8", "", "", "16", ""
-            ])
-
-        # Save to CSV
-        df = pd.DataFrame(data, columns=headers)
-        df.to_csv(self.output_csv, index=False)
+                    if not self.skip_n and shortest_segment and shortest_segment > 2:
+                        position = self.qr_extractor.position()
+                        # Always leave the last frame to be read, so a skip cannot hide the final change
+                        skip = min(shortest_segment - 2, self.qr_extractor.total_frames - position - 1)
+                        if skip > 0:
+                            resume_at = position
+                            if self.qr_extractor.skip_frames(skip) < skip:
+                                # The video is shorter than its frame count, read the rest one by one
+                                self.qr_extractor.seek(resume_at)
+                                resume_at = None
+
+            # Save last segment
+            if prev_timecode:
+                writer.writerow([
+                    video_filename, video_dir, "", frame_rate, "48000", "2", "", "H.264", "AAC",
+                    prev_timecode, prev_timecode, start_frame, self.qr_extractor.total_frames - 1, (self.qr_extractor.total_frames - start_frame),
+                    "8", "", "", "16", ""
+                ])
 
         print(f"[INFO] DaVinci Resolve CSV saved to {self.output_csv}")
 
@@ -204,12 +370,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract QR timecode from a video file and save to DaVinci Resolve CSV.")
     parser.add_argument("--video_path", help="Path to the input video file", required=True)
     parser.add_argument("--output_csv", help="Path to save the output CSV file", required=False)
+    parser.add_argument("--skip_n", help="Frames to pass over without decoding after each decoded frame", type=int, default=0)
     args = parser.parse_args()
 
     if not args.output_csv:
         args.output_csv = os.path.splitext(args.video_path)[0] + "_timecodes.csv"
 
-    processor = VideoQRTimecodeProcessor(args.video_path, args.output_csv)
+    processor = VideoQRTimecodeProcessor(args.video_path, args.output_csv, args.skip_n)
     cur_time = time.time()
     processor.process_video_threaded()
     print(f"[INFO] Processing time THREADED: {time.time() - cur_time:.2f} seconds")
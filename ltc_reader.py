@@ -0,0 +1,202 @@
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # numba is optional, without it the decoder kernels run as plain Python
+    prange = range
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+@njit(cache=True)
+def _decode_ltc_nb(runs, sync_word, reg):
+    """
+    Runs the biphase-mark state machine over the half-period lengths of an LTC signal.
+    The last 80 bits received are held in a shift register, oldest bit lowest: bits 0-63
+    in reg[0] and the sync word in reg[1]. reg[2] counts the bits since the last frame and
+    reg[3] is the toggle for the halves of a '1', so decoding carries on across calls.
+    Returns the index of the half-period that completed each frame and the frame's
+    data word (bits 0-63).
+    """
+    ends = np.empty(runs.size // 80 + 1, dtype=np.int64)
+    frames = np.empty(runs.size // 80 + 1, dtype=np.uint64)
+    count = 0
+    lo = reg[0]
+    hi = reg[1]
+    nbits = int(reg[2])
+    toggle = reg[3] != 0
+    for i in range(runs.size):
+        run = runs[i]
+        if run > 14:
+            # A long half-period is a whole '0' cell, so the next short one starts a '1'
+            bit = np.uint64(0)
+            toggle = True
+        elif run >= 7:
+            # A '1' is two short half-periods, only the first one produces the bit
+            if not toggle:
+                toggle = True
+                continue
+            toggle = False
+            bit = np.uint64(1)
+        else:
+            continue
+        lo = (lo >> np.uint64(1)) | ((hi & np.uint64(1)) << np.uint64(63))
+        hi = (hi >> np.uint64(1)) | (bit << np.uint64(15))
+        nbits += 1
+        if hi == sync_word and nbits >= 80:
+            ends[count] = i
+            frames[count] = lo
+            count += 1
+            nbits = 0
+    reg[0] = lo
+    reg[1] = hi
+    reg[2] = nbits
+    reg[3] = 1 if toggle else 0
+    return ends[:count], frames[:count]
+
+@njit(parallel=True, cache=True)
+def _decode_ltc_parallel(runs, sync_word, reg, chunk_size, overlap):
+    """
+    Decodes a long array of half-period lengths in chunks across threads. Every chunk after
+    the first starts `overlap` half-periods early with an empty register, enough to lock onto
+    the signal again, and keeps only the frames that end inside it. The first chunk continues
+    from reg and the state left by the last chunk is written back to it.
+    """
+    nchunks = (runs.size + chunk_size - 1) // chunk_size
+    capacity = (chunk_size + overlap) // 80 + 1
+    ends = np.empty((nchunks, capacity), dtype=np.int64)
+    frames = np.empty((nchunks, capacity), dtype=np.uint64)
+    counts = np.zeros(nchunks, dtype=np.int64)
+    regs = np.zeros((nchunks, 4), dtype=np.uint64)
+    for k in prange(nchunks):
+        start = k * chunk_size
+        stop = min(start + chunk_size, runs.size)
+        warmup = min(overlap, start)
+        if k == 0:
+            regs[k, :] = reg
+        else:
+            regs[k, 3] = 1
+        chunk_ends, chunk_frames = _decode_ltc_nb(runs[start - warmup:stop], sync_word, regs[k])
+        n = 0
+        for j in range(chunk_ends.size):
+            if chunk_ends[j] >= warmup:
+                ends[k, n] = chunk_ends[j] - warmup + start
+                frames[k, n] = chunk_frames[j]
+                n += 1
+        counts[k] = n
+    reg[:] = regs[nchunks - 1]
+
+    total = counts.sum()
+    all_ends = np.empty(total, dtype=np.int64)
+    all_frames = np.empty(total, dtype=np.uint64)
+    pos = 0
+    for k in range(nchunks):
+        all_ends[pos:pos + counts[k]] = ends[k, :counts[k]]
+        all_frames[pos:pos + counts[k]] = frames[k, :counts[k]]
+        pos += counts[k]
+    return all_ends, all_frames
+
+class LTCReader:
+    """
+    This class is based on the original work by Alan Telles (https://github.com/alantelles/py-ltc-reader/tree/master).
+    It has been altered to not use some variables and to be in a class form.
+    """
+    # (shift, mask) of each field within bits 0-63 of a frame, first received bit lowest
+    _FIELDS = {
+        'frame_units': (0, 0xF),
+        'user_bits_1': (4, 0xF),
+        'frame_tens': (8, 0x3),
+        'drop_frame': (10, 0x1),
+        'color_frame': (11, 0x1),
+        'user_bits_2': (12, 0xF),
+        'sec_units': (16, 0xF),
+        'user_bits_3': (20, 0xF),
+        'sec_tens': (24, 0x7),
+        'flag_1': (27, 0x1),
+        'user_bits_4': (28, 0xF),
+        'min_units': (32, 0xF),
+        'user_bits_5': (36, 0xF),
+        'min_tens': (40, 0x7),
+        'flag_2': (43, 0x1),
+        'user_bits_6': (44, 0xF),
+        'hour_units': (48, 0xF),
+        'user_bits_7': (52, 0xF),
+        'hour_tens': (56, 0x3),
+        'bgf': (58, 0x1),
+        'flag_3': (59, 0x1),
+        'user_bits_8': (60, 0xF),
+    }
+
+    def __init__(self):
+        self.SYNC_WORD = '0011111111111101'
+        self.SYNC_WORD_BITS = int(self.SYNC_WORD[::-1], 2)  # As received, oldest bit lowest
+        self.jam = '00:00:00:00'
+        self.now_tc = '00:00:00:00'
+        # Shift register words (lo, hi), bits since the last frame and the '1' toggle
+        self.reg = np.array([0, 0, 0, 1], dtype=np.uint64)
+        # Sign and length of the half-period still running at the end of the last block
+        self.last_sign = 0
+        self.run_length = 0
+        # Long recordings are decoded in chunks of this many half-periods in parallel,
+        # each one re-locking over the three frames before it
+        self.chunk_size = 1 << 16
+        self.overlap = 3 * 160
+
+    def decode_samples(self, samples):
+        """
+        Decodes an array of PCM16 samples, continuing from the previous call.
+        Returns the sample index at which each complete frame ended and the frames themselves.
+        """
+        if not samples.size:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+        # Pack the sign bits 8 to a byte and XOR them with themselves shifted by one sample;
+        # the set bits are the zero crossings, so no per-sample compare is needed
+        packed = np.packbits(samples < 0)
+        prev = np.empty_like(packed)
+        prev[0] = self.last_sign
+        prev[1:] = packed[:-1]
+        flips = packed ^ ((packed >> 1) | (prev << 7))
+        edges = np.flatnonzero(np.unpackbits(flips, count=samples.size))
+        runs = np.diff(edges, prepend=-self.run_length)
+        if edges.size:
+            self.run_length = samples.size - edges[-1]
+        else:
+            self.run_length += samples.size
+        self.last_sign = int(samples[-1] < 0)
+        if runs.size > self.chunk_size:
+            ends, frames = _decode_ltc_parallel(
+                runs, np.uint64(self.SYNC_WORD_BITS), self.reg, self.chunk_size, self.overlap
+            )
+        else:
+            ends, frames = _decode_ltc_nb(runs, np.uint64(self.SYNC_WORD_BITS), self.reg)
+        return edges[ends], frames
+
+    def decode_ltc(self, wave_frames):
+        # Accepts raw PCM16 bytes or an int16 array such as a sounddevice block
+        if isinstance(wave_frames, (bytes, bytearray)):
+            wave_frames = np.frombuffer(wave_frames, dtype='<i2')
+        _, frames = self.decode_samples(wave_frames)
+        if frames.size:
+            self.jam = self.decode_frame(int(frames[-1]))['formatted_tc']
+
+    def decode_frame(self, frame):
+        # frame holds bits 0-63 of the LTC frame, first received bit lowest
+        o = {name: (frame >> shift) & mask for name, (shift, mask) in self._FIELDS.items()}
+        o['sync_word'] = int(self.SYNC_WORD, 2)
+        o['formatted_tc'] = "{:02d}:{:02d}:{:02d}:{:02d}".format(
+            o['hour_tens']*10+o['hour_units'],
+            o['min_tens']*10+o['min_units'],
+            o['sec_tens']*10+o['sec_units'],
+            o['frame_tens']*10+o['frame_units'],
+        )
+        return o
+
+    def get_tc(self):
+        if self.jam:
+            h, m, s, f = [int(x) for x in self.jam.split(':')]
+            formatted_tc = "{:02d}:{:02d}:{:02d}:{:02d}".format(h, m, s, f)
+            self.now_tc = formatted_tc
+        return self.now_tc